@@ -95,5 +95,8 @@ def main():
     scanner = Scanner(org, refdir, username, password)
     repos = scanner.get_repos()
     scanner.scan()
-    scanner.check_for_releases()
+    failed = scanner.check_for_releases()
     scanner.write_refs()
+    if failed:
+        print(f'Release checks failed for: {", ".join(failed)}')
+        sys.exit(1)
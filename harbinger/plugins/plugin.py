@@ -2,12 +2,23 @@ from abc import ABC, abstractmethod
 
 class Plugin(ABC):
     def __init__(self, params, reference):
+        '''Query the upstream version information. Plugins may be
+        instantiated concurrently from several threads, so they must keep
+        their working data in memory and must not rely on or change the
+        current working directory.'''
         super().__init__()
         #TODO: Investigate whether having these abstract properties
         #      streamlines things elsewhere.
         #self.ref_ver_data = None
         #self.new_ver_data = None
 
+    @classmethod
+    def peek_version(cls, params, reference):
+        '''Optionally determine the upstream version cheaply, without doing
+        the full version query performed when the plugin is instantiated.
+        Return None if the version cannot be determined this way.'''
+        return None
+
     @abstractmethod
     def new_version_available(self):
         '''Is a new version of the dependency available?'''
@@ -1,92 +1,288 @@
 # cfitsio-specific version update checker
 import os
+import io
+import re
 import urllib.request
+import urllib.error
 import tarfile
+import hashlib
 import copy
 
+import yaml
+
 from ..plugins import plugin
+from ..utils import yaml_load, yaml_dump, atomic_write
+
+LATEST_URL = ('https://heasarc.gsfc.nasa.gov/FTP/software/fitsio/c/'
+              'cfitsio_latest.tar.gz')
+# Leading byte ranges of the tarball to try before downloading all of it.
+RANGE_SIZES = (4 << 20, 8 << 20, 16 << 20, 32 << 20)
+# Buffer sizes used when reading the tarball and when tarfile pulls
+# compressed data from that reader; large reads mean far fewer syscalls.
+READ_BUFSIZE = 1 << 20
+TAR_BUFSIZE = 256 << 10
+# Location of previously parsed results, keyed by upstream tarball identity.
+CACHE_DIR = os.path.join(os.environ.get('XDG_CACHE_HOME')
+                         or os.path.expanduser(os.path.join('~', '.cache')),
+                         'harbinger', 'cfitsio')
+
+# Patterns operate on the raw bytes of the tar members so that only the
+# matched values need to be decoded.
+_DEFINE_RE = re.compile(
+        rb'^[ \t]*#define[ \t]+CFITSIO_(VERSION|SONAME)[ \t]+(\S+)', re.M)
+_TRAILER = ('\n\n(For complete changelog information, consult the package '
+            'changelog file in cfitsio/doc/changes.txt)')
+
+
+def _build_request(url, ref_ver_data, range_size=None, method=None):
+    '''Return a request for the tarball, limited to the first `range_size`
+    bytes if given, and made conditional on the validators recorded in the
+    reference so that an unchanged tarball is answered with HTTP 304 (Not
+    Modified), meaning the reference is still current, instead of being
+    downloaded again.'''
+    request = urllib.request.Request(url, method=method)
+    if range_size:
+        request.add_header('Range', f'bytes=0-{range_size - 1}')
+    if ref_ver_data.get('etag'):
+        request.add_header('If-None-Match', ref_ver_data['etag'])
+    if ref_ver_data.get('last_modified'):
+        request.add_header('If-Modified-Since', ref_ver_data['last_modified'])
+    return request
+
+
+def _validators(headers):
+    '''Return the HTTP validators found in response headers as reference
+    values.'''
+    validators = {}
+    for key, header in (('etag', 'ETag'), ('last_modified', 'Last-Modified')):
+        if headers.get(header):
+            validators[key] = headers[header]
+    return validators
+
+
+def _tarball_size(headers):
+    '''Return the full size of the tarball according to the headers of a
+    HEAD, complete or partial (206) response, or None if unknown.'''
+    content_range = headers.get('Content-Range')
+    if content_range:
+        total = content_range.rpartition('/')[2]
+        return None if total == '*' else total
+    return headers.get('Content-Length')
+
+
+def _cache_path(url, headers):
+    '''Return the path of the cache file for the tarball described by the
+    given response headers, or None if they do not identify it well enough.'''
+    length = _tarball_size(headers)
+    modified = headers.get('Last-Modified')
+    if not (length and modified):
+        return None
+    key = hashlib.sha256(f'{url}\n{length}\n{modified}'.encode())
+    return os.path.join(CACHE_DIR, f'{key.hexdigest()}.yaml')
+
+
+def _load_cache(cache_file):
+    '''Return the values stored in a cache file, or None on a miss.'''
+    if not cache_file:
+        return None
+    try:
+        with open(cache_file) as f:
+            cached = yaml_load(f)
+    except (OSError, yaml.YAMLError):
+        return None
+    if (not isinstance(cached, dict) or 'version' not in cached
+            or not isinstance(cached.get('latest_changes'), str)):
+        return None
+    return cached
+
 
 class plugin(plugin.Plugin):
 
     def __init__(self, params, ref_ver_data, tarball=None):
-        '''Download and extract key files from source tarball.
+        '''Stream key files from the source tarball into memory.
         Read in header file.
-        Read in changelog file.'''
+        Read in the latest section of the changelog file.
+        Nothing is read if the tarball is unchanged or already cached.'''
 
         self.ref_ver_data = ref_ver_data
         self.new_ver_data = copy.deepcopy(self.ref_ver_data)
 
+        self.version = self.ref_ver_data['version']
+        self.soname = self.ref_ver_data.get('soname')
+        http_headers = {}
+        self.header = None
+        self.latest_changes = None
+        cache_file = None
         if tarball:
-            latest_tar = tarball
+            self._scan_tarball(open(tarball, 'rb', buffering=READ_BUFSIZE))
         else:
-            latest_tar = 'cfitsio_latest.tar.gz'
-            latest_URL = f'http://heasarc.gsfc.nasa.gov/FTP/software/fitsio/c/{latest_tar}'
-            urllib.request.urlretrieve(latest_URL, latest_tar)
-    
-        tfile = tarfile.open(latest_tar, mode='r')
-        members = tfile.getmembers()
-        for member in members:
-            bname = os.path.basename(member.path)
-            if bname == 'fitsio.h':
-                tfile.extract(member.path)
-                fitsio_h_path = member.path
-            if bname == 'changes.txt':
-                tfile.extract(member.path)
-                changesfile_path = member.path
-        with open(fitsio_h_path, 'r') as f:
-            self.header = f.readlines()
-        with open(changesfile_path) as f:
-            self.changelog = f.readlines()
-        # Extract version value from the source code. Update new_ver_data.
-        for line in self.header:
-            if 'CFITSIO_VERSION' in line.strip():
-                self.version = line.strip().split()[2]
-                self.new_ver_data['version'] = self.version
-                break
-        # Extract SONAME value from the source code. Update new_ver_data.
-        self.soname = None
-        for line in self.header:
-            if 'CFITSIO_SONAME' in line.strip():
-                self.soname = line.strip().split()[2]
-                self.new_ver_data['soname'] = self.soname
+            # Try to get away with only the leading portion of the tarball,
+            # growing the requested range until both files have been seen
+            # and finally falling back to the complete download.
+            for attempt, range_size in enumerate(RANGE_SIZES + (None,)):
+                request = _build_request(LATEST_URL, self.ref_ver_data,
+                                         range_size)
+                try:
+                    response = urllib.request.urlopen(request)
+                except urllib.error.HTTPError as e:
+                    if e.code == 304:
+                        self.latest_changes = ''
+                        return
+                    raise
+                http_headers = _validators(response.headers)
+                # The response headers identify the tarball, so a previously
+                # parsed copy can be used without reading the body at all.
+                if attempt == 0:
+                    cache_file = _cache_path(LATEST_URL, response.headers)
+                    if self._read_cache(cache_file):
+                        response.close()
+                        self.new_ver_data.update(http_headers)
+                        return
+                # Stream the response straight into tarfile so download and
+                # decompression overlap and no copy of the tarball hits the
+                # disk.
+                stream = io.BufferedReader(response,
+                                           buffer_size=READ_BUFSIZE)
+                # A 200 means the server ignored the Range header and sent
+                # everything, as does a range covering the whole tarball;
+                # there is nothing more to be had by retrying.
+                size = _tarball_size(response.headers)
+                complete = (response.status != 206
+                            or (size and size.isdigit()
+                                and range_size >= int(size)))
+                if self._scan_tarball(stream) or complete:
+                    break
+        for name, value in (('fitsio.h', self.header),
+                            ('changes.txt', self.latest_changes)):
+            if value is None:
+                raise RuntimeError(f'cfitsio tarball lacks {name}')
+        # Extract version and SONAME values from the source code in a single
+        # scan that stops once both have been found. (Older releases have no
+        # SONAME.) Update new_ver_data.
+        defines = {}
+        for m in _DEFINE_RE.finditer(self.header):
+            defines.setdefault(m.group(1), m.group(2).decode())
+            if len(defines) == 2:
                 break
+        self.version = defines[b'VERSION']
+        self.new_ver_data['version'] = self.version
+        self.soname = defines.get(b'SONAME')
+        if self.soname is not None:
+            self.new_ver_data['soname'] = self.soname
+        # Only record the HTTP validators once the tarball has been parsed
+        # successfully.
+        self.new_ver_data.update(http_headers)
+        if cache_file:
+            self._write_cache(cache_file)
+
+    @classmethod
+    def peek_version(cls, params, reference):
+        '''Return the upstream version using only a HEAD request, if the
+        tarball is unchanged or already cached.'''
+        request = _build_request(LATEST_URL, reference, method='HEAD')
+        try:
+            with urllib.request.urlopen(request) as response:
+                headers = response.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return reference.get('version')
+            raise
+        cached = _load_cache(_cache_path(LATEST_URL, headers))
+        if cached:
+            return cached['version']
+        return None
+
+    def _read_cache(self, cache_file):
+        '''Populate version values from a cache file. Returns True on a
+        cache hit.'''
+        cached = _load_cache(cache_file)
+        if cached is None:
+            return False
+        self.version = cached['version']
+        self.new_ver_data['version'] = self.version
+        self.soname = cached.get('soname')
+        if self.soname is not None:
+            self.new_ver_data['soname'] = self.soname
+        self.latest_changes = cached['latest_changes']
+        return True
+
+    def _write_cache(self, cache_file):
+        '''Save the parsed values for reuse by later runs, replacing entries
+        for older tarballs, which will not be asked for again. Failure to do
+        so is not fatal.'''
+        cached = {'version': self.version,
+                  'soname': self.soname,
+                  'latest_changes': self.latest_changes}
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            atomic_write(cache_file, yaml_dump(cached))
+            for entry in os.listdir(CACHE_DIR):
+                path = os.path.join(CACHE_DIR, entry)
+                if entry.endswith('.yaml') and path != cache_file:
+                    os.remove(path)
+        except OSError as e:
+            print(f'Unable to write cfitsio cache file {cache_file}: {e}')
+
+    def _scan_tarball(self, stream):
+        '''Read fitsio.h and the latest changes.txt entry from a (possibly
+        truncated) tar.gz stream. Sequential-only access is used; only the
+        two files of interest are read, directly into memory, and the stream
+        is abandoned once both have been seen. Returns True if both were
+        found.'''
+        with stream, tarfile.open(fileobj=stream, mode='r|gz',
+                                  bufsize=TAR_BUFSIZE) as tfile:
+            try:
+                for member in tfile:
+                    bname = os.path.basename(member.name)
+                    if bname == 'fitsio.h':
+                        self.header = tfile.extractfile(member).read()
+                    elif bname == 'changes.txt':
+                        self.latest_changes = self._read_latest_changes(
+                                tfile.extractfile(member))
+                    if (self.header is not None
+                            and self.latest_changes is not None):
+                        return True
+            except (tarfile.ReadError, EOFError):
+                # Ran off the end of a partial download.
+                pass
+        return self.header is not None and self.latest_changes is not None
+
+    @staticmethod
+    def _read_latest_changes(changelog):
+        '''Return the most recent section of the changelog, reading no
+        further than the heading of the section that follows it.'''
+        head = []
+        section = None
+        for line in changelog:
+            if line.lstrip().startswith(b'Version '):
+                if section is not None:
+                    break
+                section = []
+            if section is not None:
+                section.append(line)
+            elif len(head) < 21:
+                head.append(line)
+        # If extraction of latest changelog entry fails, just grab the
+        # first 20 lines of the changelog.
+        if section is None:
+            section = head
+        return b''.join(section).decode(errors='replace')
 
     def new_version_available(self):
         return self.new_ver_data['version'] != self.ref_ver_data['version']
 
     def version_data(self):
         '''Return reference dict with updated version and other values.'''
-        return(self.new_ver_data)
+        return self.new_ver_data
 
     def get_extra(self):
         '''Return changelog and SONAME version comparison information for
         inclusion in the notification message.'''
-        # TODO: Look into a regex solution to this?
-        sec_open = False
-        latest_changes = ''
-        for line in self.changelog:
-            if 'Version' in line.strip() and sec_open:
-                break
-            if 'Version' in line.strip() and not sec_open:
-                sec_open = True
-                latest_changes += line
-                continue
-            if sec_open:
-                latest_changes += line
-                continue
-        # If extraction of latest changelog entry fails, just grab the
-        # first 20 lines of the changelog.
-        if latest_changes == '':
-            for line in self.changelog[0:21]:
-                latest_changes += line
-        latest_changes += ('\n\n(For complete changelog information,'
-                          ' consult the package changelog file in'
-                          ' cfitsio/doc/changes.txt)')
+        buf = [self.latest_changes, _TRAILER]
         ref_soname = self.ref_ver_data['soname']
         if ref_soname != self.soname:
-            latest_changes += (
+            buf.append(
                     f'\n\n\n  **NOTE: This release introduces a SONAME '
                     f'change from {ref_soname} to {self.soname}.**'
             )
-        return(latest_changes)
-
+        return ''.join(buf)
@@ -5,7 +5,6 @@
 # requirement and thus do not need the `github` argument on the __init__()
 # call.
 import copy
-import github3
 
 # TODO: Handle regex as a parameter to use when selecting tags?
 
@@ -1,8 +1,10 @@
 import os
-import shutil
+import io
+import tarfile
+import urllib.request
+import urllib.error
 import pytest
 from ..plugins import relcheck_cfitsio
-from ..utils import pushd
 
 # TODO: Make this all self-contained by creating the tar.gz files
 #       from data stored in this file and then running it through
@@ -31,34 +33,131 @@ soname_notice = ('\n\n\n  **NOTE: This release introduces a SONAME '
 changelog_w_soname = changelog + soname_notice
 
 
-def test_new_version_available(tmpdir):
-    shutil.copy(os.path.join(test_dir, tarball), tmpdir) 
-    with pushd(tmpdir):
-        p = relcheck_cfitsio.plugin(params, test_reference, tarball)
-        assert (not p.new_version_available())
-
-def test_version_data(tmpdir):
-    shutil.copy(os.path.join(test_dir, tarball), tmpdir) 
-    with pushd(tmpdir):
-        p = relcheck_cfitsio.plugin(params, test_reference, tarball)
-        assert p.version_data() == test_reference
-        
-def test_get_extra(tmpdir):
-    shutil.copy(os.path.join(test_dir, tarball), tmpdir) 
-    with pushd(tmpdir):
-        p = relcheck_cfitsio.plugin(params, test_reference, tarball)
-        assert p.get_extra() == changelog
-
-def test_get_extra_w_soname(tmpdir):
-    shutil.copy(os.path.join(test_dir, tarball), tmpdir) 
-    with pushd(tmpdir):
-        p = relcheck_cfitsio.plugin(params, test_reference, tarball)
-        p.ref_ver_data['soname'] = '0'
-        p.soname = '1'
-        assert p.get_extra() == changelog_w_soname
-
-def test_get_extra_nonstandard_changelog(tmpdir):
-    shutil.copy(os.path.join(test_dir, nonstd_tarball), tmpdir) 
-    with pushd(tmpdir):
-        p = relcheck_cfitsio.plugin(params, test_reference, nonstd_tarball)
-        assert p.get_extra() == parsefail_changelog
+def test_new_version_available():
+    p = relcheck_cfitsio.plugin(params, test_reference,
+                                os.path.join(test_dir, tarball))
+    assert (not p.new_version_available())
+
+def test_version_data():
+    p = relcheck_cfitsio.plugin(params, test_reference,
+                                os.path.join(test_dir, tarball))
+    assert p.version_data() == test_reference
+    
+def test_get_extra():
+    p = relcheck_cfitsio.plugin(params, test_reference,
+                                os.path.join(test_dir, tarball))
+    assert p.get_extra() == changelog
+
+def test_get_extra_w_soname():
+    p = relcheck_cfitsio.plugin(params, test_reference,
+                                os.path.join(test_dir, tarball))
+    p.ref_ver_data['soname'] = '0'
+    p.soname = '1'
+    assert p.get_extra() == changelog_w_soname
+
+def test_get_extra_nonstandard_changelog():
+    p = relcheck_cfitsio.plugin(params, test_reference,
+                                os.path.join(test_dir, nonstd_tarball))
+    assert p.get_extra() == parsefail_changelog
+
+def mock_response(body=b'', status=200, headers=None):
+    response = io.BytesIO(body)
+    response.status = status
+    response.headers = headers if headers is not None else {}
+    return response
+
+@pytest.fixture
+def cache_dir(tmpdir, monkeypatch):
+    monkeypatch.setattr(relcheck_cfitsio, 'CACHE_DIR', str(tmpdir))
+    return tmpdir
+
+def test_not_modified(monkeypatch, cache_dir):
+    def urlopen(request):
+        raise urllib.error.HTTPError(request.full_url, 304, 'Not Modified',
+                                     None, None)
+    monkeypatch.setattr(urllib.request, 'urlopen', urlopen)
+    reference = dict(test_reference, etag='"abc"')
+    p = relcheck_cfitsio.plugin(params, reference)
+    assert (not p.new_version_available())
+    assert p.version_data() == reference
+    assert p.get_extra().startswith('\n\n(For complete changelog')
+
+def test_truncated_tarball(monkeypatch, cache_dir):
+    with open(os.path.join(test_dir, tarball), 'rb') as f:
+        data = f.read()
+    requests = []
+    def urlopen(request):
+        requests.append(request.get_header('Range'))
+        if len(requests) == 1:
+            return mock_response(data[:len(data) // 2], 206)
+        return mock_response(data, 206)
+    monkeypatch.setattr(urllib.request, 'urlopen', urlopen)
+    p = relcheck_cfitsio.plugin(params, {'version': '0.99', 'soname': '0'})
+    assert requests == ['bytes=0-4194303', 'bytes=0-8388607']
+    assert p.version_data() == {'version': '1.00', 'soname': '1'}
+
+def test_cached_result(monkeypatch, cache_dir):
+    with open(os.path.join(test_dir, tarball), 'rb') as f:
+        data = f.read()
+    headers = {'Content-Length': str(len(data)),
+               'Last-Modified': 'Mon, 01 Jan 2018 00:00:00 GMT'}
+    requests = []
+    def urlopen(request):
+        requests.append(request.get_method())
+        if request.get_method() == 'HEAD':
+            return mock_response(headers=headers)
+        return mock_response(data, headers=headers)
+    monkeypatch.setattr(urllib.request, 'urlopen', urlopen)
+    reference = {'version': '0.99', 'soname': '1'}
+    p = relcheck_cfitsio.plugin(params, reference)
+    assert requests == ['GET']
+    p_cached = relcheck_cfitsio.plugin(params, reference)
+    assert requests == ['GET', 'GET']
+    assert p_cached.header is None
+    assert relcheck_cfitsio.plugin.peek_version(params, reference) == '1.00'
+    assert requests == ['GET', 'GET', 'HEAD']
+    headers['Last-Modified'] = 'Tue, 02 Jan 2018 00:00:00 GMT'
+    relcheck_cfitsio.plugin(params, reference)
+    assert len(cache_dir.listdir()) == 1
+    assert p_cached.version_data() == p.version_data()
+    assert p_cached.get_extra() == changelog
+
+def test_no_soname(tmpdir):
+    nosoname_tarball = os.path.join(str(tmpdir), 'cfitsio_nosoname.tar.gz')
+    with tarfile.open(nosoname_tarball, 'w:gz') as tfile:
+        for name, data in (('cfitsio/fitsio.h',
+                            b'#define CFITSIO_VERSION 0.99\n'),
+                           ('cfitsio/docs/changes.txt',
+                            b'Version 0.99 - Mon Year\n')):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tfile.addfile(info, io.BytesIO(data))
+    p = relcheck_cfitsio.plugin(params, {'version': '0.98', 'soname': None},
+                                nosoname_tarball)
+    assert p.new_version_available()
+    assert p.version_data() == {'version': '0.99', 'soname': None}
+
+def test_range_covers_tarball(monkeypatch, cache_dir):
+    with open(os.path.join(test_dir, tarball), 'rb') as f:
+        data = f.read()
+    headers = {'Content-Range': f'bytes 0-{len(data) - 1}/{len(data)}'}
+    requests = []
+    def urlopen(request):
+        requests.append(request.get_header('Range'))
+        # A tarball lacking changes.txt; only the header survives the cut.
+        return mock_response(data[:len(data) // 2], 206, headers)
+    monkeypatch.setattr(urllib.request, 'urlopen', urlopen)
+    with pytest.raises(RuntimeError, match='lacks fitsio.h'):
+        relcheck_cfitsio.plugin(params, {'version': '0.99', 'soname': '0'})
+    assert requests == ['bytes=0-4194303']
+
+def test_no_changelog(tmpdir):
+    nochanges_tarball = os.path.join(str(tmpdir), 'cfitsio_nochanges.tar.gz')
+    with tarfile.open(nochanges_tarball, 'w:gz') as tfile:
+        data = b'#define CFITSIO_VERSION 0.99\n'
+        info = tarfile.TarInfo('cfitsio/fitsio.h')
+        info.size = len(data)
+        tfile.addfile(info, io.BytesIO(data))
+    with pytest.raises(RuntimeError, match='lacks changes.txt'):
+        relcheck_cfitsio.plugin(params, {'version': '0.98', 'soname': None},
+                                nochanges_tarball)
@@ -2,7 +2,6 @@ import os
 import shutil
 import pytest
 from ..plugins import relcheck_github
-from ..utils import pushd
 from ..mock_github3 import *
 
 params = {'name': 'org/reponame', 'release_style': 'github'}
@@ -8,13 +8,9 @@
 # The polling logic to use for each project is defined by one or more plugin
 # modules.
 
-import os
 import importlib
-import tempfile
-
-import yaml
-import github3
-from .utils import pushd
+import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 
 class ReleaseNotifier():
@@ -62,8 +58,12 @@ class ReleaseNotifier():
                              f'that monitors `{self.dep_name}` releases.\n\n')
         self.dry_run = dry_run
         self.remote_ver = None
+        self.new_version_detected = False
+        self.check_failed = False
 
-    def load_plugin(self):
+    def import_plugin(self):
+        if self.plugin_module:
+            return
         if '/' in self.dep_name:  # Github dependency
             plugin_name = f'.plugins.relcheck_github'
         else:
@@ -73,23 +73,33 @@ class ReleaseNotifier():
         except ImportError as e:
             print(f'Import of plugin {plugin_name} failed.\n\n')
             raise(ImportError)
-        # Change to temporary directory before creating plugin object
-        # to provide a clean location for it to create files, if necessary.
-        with tempfile.TemporaryDirectory() as tmpdir:
-            with pushd(tmpdir):
-                # If depdency is hosted on Github, pass in the local github object
-                # to use when making API queries, otherwise instantiate a normal
-                # plugin object.
-                if '/' in self.dep_name:  # Github dependency
-                    self.params['name'] = self.dep_name
-                    #print(f'self.ref = {self.ref}')
-                    self.plugin = self.plugin_module.plugin(
-                            self.params,
-                            self.ref,
-                            ReleaseNotifier.github)
-                else:
-                    self.plugin = self.plugin_module.plugin(self.params,
-                                                  self.ref)
+
+    def peek_version(self):
+        '''Return the upstream version if the plugin can determine it
+        without a full version query, otherwise None.'''
+        self.import_plugin()
+        peek = getattr(self.plugin_module.plugin, 'peek_version', None)
+        if peek is None:
+            return None
+        return peek(self.params, self.ref)
+
+    def load_plugin(self):
+        self.import_plugin()
+        # If depdency is hosted on Github, pass in the local github object
+        # to use when making API queries, otherwise instantiate a normal
+        # plugin object.
+        # NOTE: Plugins are instantiated concurrently by run_all() and so
+        #       must not depend on or change the current working directory.
+        if '/' in self.dep_name:  # Github dependency
+            self.params['name'] = self.dep_name
+            #print(f'self.ref = {self.ref}')
+            self.plugin = self.plugin_module.plugin(
+                    self.params,
+                    self.ref,
+                    ReleaseNotifier.github)
+        else:
+            self.plugin = self.plugin_module.plugin(self.params,
+                                          self.ref)
 
     def new_version_available(self):
         return self.plugin.new_version_available()
@@ -113,8 +123,13 @@ class ReleaseNotifier():
                     self.comment)
 
     def check_for_release(self):
-        self.load_plugin()
-        if self.new_version_available():
+        # Skip the (potentially expensive) plugin instantiation entirely
+        # when a cheap query shows the reference version is still current.
+        self.plugin = None
+        peeked = self.peek_version()
+        if peeked is None or peeked != self.ref.get('version'):
+            self.load_plugin()
+        if self.plugin and self.new_version_available():
             print(f'A version change has been detected for {self.dep_name}')
             print(f'Reference: {self.ref}')
             self.comment = self.get_extra()
@@ -126,6 +141,39 @@ class ReleaseNotifier():
             return True
         else:
             print(f'No new version detected for {self.dep_name}')
+            # The version is unchanged, but the plugin may still have updated
+            # other reference values (e.g. HTTP validators) worth keeping.
+            if self.plugin:
+                self.ref = self.version_data()
             self.new_version_detected = False
             return False
 
+
+def _check(notifier):
+    '''Run a single release check. A failure is reported with its traceback
+    and recorded on the notifier (check_failed) rather than raised, so that
+    it does not affect the other dependencies. Returns None on failure.'''
+    try:
+        return notifier.check_for_release()
+    except Exception:
+        print(f'Release check for {notifier.dep_name} FAILED:')
+        traceback.print_exc()
+        notifier.new_version_detected = False
+        notifier.check_failed = True
+        return None
+
+
+def run_all(notifiers, max_workers=8):
+    '''Call check_for_release() on each of the given ReleaseNotifier objects.
+    The checks are dominated by network I/O, so they are run concurrently in
+    threads, except for Github-hosted dependencies, which all share one
+    github3.py session and are checked one at a time on the calling thread.
+    Returns the list of results in the order given, with None for any check
+    that failed.'''
+    notifiers = list(notifiers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {n: executor.submit(_check, n)
+                   for n in notifiers if '/' not in n.dep_name}
+        results = {n: _check(n) for n in notifiers if '/' in n.dep_name}
+    return [futures[n].result() if n in futures else results[n]
+            for n in notifiers]
@@ -1,10 +1,10 @@
 import os
 import urllib
 import configparser
-import yaml
 import github3
 import json
 from .release_notifier import *
+from .utils import yaml_load, yaml_dump, atomic_write
 
 class Scanner():
 
@@ -52,7 +52,7 @@ class Scanner():
 
     def read_refs(self):
         with open(self.refs_file) as f:
-            self.refs = yaml.safe_load(f)
+            self.refs = yaml_load(f)
 
     def scan(self):
         print(f'Scanning {self.org}...')
@@ -78,26 +78,35 @@ class Scanner():
             self.dep_requests[repo] = repoconfig
 
     def check_for_releases(self):
+        '''Check all requested dependencies and post issues for new
+        versions. Returns the names of dependencies whose check failed.'''
         self.repos = self.get_repos()
+        # One notifier per dependency, regardless of how many repos use it.
         for repo in self.dep_requests:
-            print(f'\nProcessing deps defined in {repo}')
             for dep in self.dep_requests[repo]:
-                print(f'   {dep}')
                 if dep not in self.notifiers:
                     ref = self.refs[dep]
-                    noti = ReleaseNotifier(dep,
-                                           self.dep_requests[repo][dep],
-                                           ref,
-                                           f'{self.org}/{repo}',
-                                           self.gh,
-                                           dry_run=self.dry_run)
-                    noti.check_for_release()
-                    self.notifiers[dep] = noti
-                    if noti.new_version_detected:
-                        self.refs[dep] = noti.ref
+                    self.notifiers[dep] = ReleaseNotifier(
+                            dep,
+                            self.dep_requests[repo][dep],
+                            ref,
+                            f'{self.org}/{repo}',
+                            self.gh,
+                            dry_run=self.dry_run)
+        # Query all dependencies concurrently.
+        run_all(self.notifiers.values())
+        # Reference data may change even without a new version, so always
+        # take the notifier's copy.
+        for dep, noti in self.notifiers.items():
+            self.refs[dep] = noti.ref
+        for repo in self.dep_requests:
+            print(f'\nProcessing deps defined in {repo}')
+            for dep in self.dep_requests[repo]:
+                print(f'   {dep}')
                 if self.notifiers[dep].new_version_detected:
                     self.notifiers[dep].post_github_issue(f'{self.org}/{repo}')
-                
+        return [dep for dep, noti in self.notifiers.items()
+                if noti.check_failed]
+
     def write_refs(self):
-        with open(self.refs_file, 'w') as f:
-            f.write(yaml.safe_dump(self.refs))
+        atomic_write(self.refs_file, yaml_dump(self.refs))
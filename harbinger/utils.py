@@ -1,16 +1,50 @@
 import os
-from contextlib import contextmanager
+import shutil
+import secrets
 
-@contextmanager
-def pushd(newDir):
-    '''Context manager function for shell-like pushd functionality
+import yaml
+# Prefer the libyaml-backed C implementations when PyYAML was built with them.
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
 
-    Allows for constructs like:
-    with pushd(directory):
-        'code'...
-    When 'code' is finished, the working directory is restored to what it
-    was when pushd was invoked.'''
-    previousDir = os.getcwd()
-    os.chdir(newDir)
-    yield
-    os.chdir(previousDir)
+
+def yaml_load(stream):
+    '''Equivalent of yaml.safe_load() using the fastest available loader.'''
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def yaml_dump(data):
+    '''Equivalent of yaml.safe_dump() using the fastest available dumper.'''
+    return yaml.dump(data, Dumper=SafeDumper)
+
+
+def atomic_write(path, text):
+    '''Write `text` to `path` such that readers see either the previous
+    contents or the complete new contents, never a partially written file,
+    and the new contents survive a crash once this returns. The permissions
+    of an existing file are preserved; a new file gets the usual
+    umask-derived mode.'''
+    directory = os.path.dirname(path) or '.'
+    # Unique per writer, so concurrent writes of the same path don't collide.
+    tmp = f'{path}.{secrets.token_hex(8)}.tmp'
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with open(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    # Make the rename itself durable.
+    if os.name == 'posix':
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
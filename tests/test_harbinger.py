@@ -1,11 +1,13 @@
 import os
 import shutil
 import ast
+import threading
 import yaml
 import pytest
-from harbinger.release_notifier import ReleaseNotifier
+from harbinger.release_notifier import ReleaseNotifier, run_all
 from harbinger.scanner import Scanner
 from harbinger.mock_github3 import *
+from harbinger.utils import atomic_write
 
 depname = 'test'
 params = {'plugin': 'relcheck_test'}
@@ -34,7 +36,33 @@ def test_write_refs(tmp_path):
     scanner.refs_file = refs_file
     scanner.write_refs()
     assert scanner.refs == new_reference
-    
+
+
+def test_atomic_write(tmp_path):
+    refs_file = os.path.join(tmp_path, 'references.yml')
+    umask = os.umask(0o022)
+    try:
+        atomic_write(refs_file, 'old')
+    finally:
+        os.umask(umask)
+    assert os.stat(refs_file).st_mode & 0o777 == 0o644
+    os.chmod(refs_file, 0o640)
+    atomic_write(refs_file, 'new')
+    with open(refs_file) as f:
+        assert f.read() == 'new'
+    assert os.stat(refs_file).st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == ['references.yml']
+
+
+def test_atomic_write_failure(tmp_path):
+    refs_file = os.path.join(tmp_path, 'references.yml')
+    atomic_write(refs_file, 'old')
+    with pytest.raises(TypeError):
+        atomic_write(refs_file, None)
+    with open(refs_file) as f:
+        assert f.read() == 'old'
+    assert os.listdir(tmp_path) == ['references.yml']
+
 
 # Fixtures
 @pytest.fixture(scope='module')
@@ -83,7 +111,69 @@ def test_get_extra(notifier):
     assert notifier.get_extra() == 'Extra info'
 
 
+def test_check_for_release_peek_unchanged(monkeypatch):
+    n = ReleaseNotifier(depname,
+                        params,
+                        {'version': '0.0.0'},
+                        notify_repo,
+                        mock_gh('tagname'))
+    n.import_plugin()
+    monkeypatch.setattr(n.plugin_module.plugin, 'peek_version',
+                        classmethod(lambda cls, params, ref: '0.0.0'))
+    n.load_plugin()
+    assert n.check_for_release() == False
+    assert n.plugin is None
+
+
+def test_check_for_release_keeps_reference_updates(monkeypatch):
+    n = ReleaseNotifier(depname,
+                        params,
+                        {'version': '0.0.0'},
+                        notify_repo,
+                        mock_gh('tagname'))
+    n.import_plugin()
+    monkeypatch.setattr(n.plugin_module.plugin, 'new_version_available',
+                        lambda self: False)
+    monkeypatch.setattr(n.plugin_module.plugin, 'version_data',
+                        lambda self: {'version': '0.0.0', 'etag': '"new"'})
+    assert n.check_for_release() == False
+    assert n.ref == {'version': '0.0.0', 'etag': '"new"'}
+
+
+def test_run_all():
+    notifiers = [ReleaseNotifier(depname,
+                                 params,
+                                 {'version': '0.0.0'},
+                                 notify_repo,
+                                 mock_gh('tagname')) for i in range(3)]
+    assert run_all(notifiers) == [True, True, True]
+    assert all(n.new_version_detected for n in notifiers)
+
+
 #def test_post_github_issue():
 
 
 #def test_harbinger_cli():
+
+
+def test_run_all_failure_and_github_serial(monkeypatch):
+    threads = {}
+    def check_for_release(self):
+        threads[self.dep_name] = threading.current_thread()
+        if self.dep_name == 'broken':
+            raise ConnectionError('unreachable')
+        self.new_version_detected = True
+        return True
+    monkeypatch.setattr(ReleaseNotifier, 'check_for_release',
+                        check_for_release)
+    notifiers = [ReleaseNotifier(name,
+                                 params,
+                                 {'version': '0.0.0'},
+                                 notify_repo,
+                                 mock_gh('tagname'))
+                 for name in ('broken', 'test', 'org/reponame')]
+    assert run_all(notifiers) == [None, True, True]
+    assert notifiers[0].new_version_detected == False
+    assert [n.check_failed for n in notifiers] == [True, False, False]
+    assert threads['org/reponame'] is threading.current_thread()
+    assert threads['test'] is not threading.current_thread()